@@ -7,75 +7,79 @@
 
 import pandas as pd
 import numpy as np
-import pymannkendall as mk
 import os
+from rainfall_utils import mann_kendall_batch, normalize_columns
 
 # === 1. File paths ===
-monthly_path = r"G:\Badhan --Study material  (Geology)\0 paper\0 Rainfall trend analysis\Rainfall 1989-2023\Rainfall_monthly_1989_2023.csv"
+monthly_path = r"G:\Badhan --Study material  (Geology)\0 paper\0 Rainfall trend analysis\Rainfall 1989-2023\Rainfall_monthly_1989_2023.parquet"
 output_dir = os.path.dirname(monthly_path)
 
 # === 2. Load data ===
 print("🔹 Loading monthly rainfall data...")
-df = pd.read_csv(monthly_path)
-df.columns = [c.strip().capitalize() for c in df.columns]
-
-# Ensure correct data types
-df["Year"] = df["Year"].astype(int)
-df["Month"] = df["Month"].astype(int)
-df["Rainfall"] = pd.to_numeric(df["Rainfall"], errors="coerce")
+df = pd.read_parquet(monthly_path)
+normalize_columns(df)
+# narrow dtypes by the normalized names (no-op for the aggregate_rainfall.py parquet)
+df = df.astype({"Station": "category", "Year": "int16", "Month": "int8"})
 
 # === 3. Define seasons ===
-def classify_season(month):
-    if month in [12, 1, 2]:
-        return "Winter"
-    elif month in [3, 4, 5]:
-        return "Pre-monsoon"
-    elif month in [6, 7, 8, 9]:
-        return "Monsoon"
-    elif month in [10, 11]:
-        return "Post-monsoon"
-    else:
-        return None
+# lookup table indexed by month number (index 0 unused)
+season_lut = np.array([None,
+                       "Winter", "Winter",                          # Jan, Feb
+                       "Pre-monsoon", "Pre-monsoon", "Pre-monsoon", # Mar–May
+                       "Monsoon", "Monsoon", "Monsoon", "Monsoon",  # Jun–Sep
+                       "Post-monsoon", "Post-monsoon",              # Oct, Nov
+                       "Winter"],                                   # Dec
+                      dtype=object)
 
-df["Season"] = df["Month"].apply(classify_season)
+df["Season"] = season_lut[df["Month"].to_numpy()]
 
 # === 4. Aggregate by season ===
 seasonal = (
-    df.groupby(["Station", "Year", "Season"])["Rainfall"]
+    df.groupby(["Station", "Year", "Season"], observed=True)["Rainfall"]
     .sum()
     .reset_index()
 )
 
 # === 5. Compute Mann-Kendall & Sen’s slope ===
-results = []
-stations = sorted(seasonal["Station"].unique())
 seasons = ["Winter", "Pre-monsoon", "Monsoon", "Post-monsoon"]
 
-print(f"📊 Calculating trends for {len(stations)} stations...")
+# Sort once (station, season order, year) and walk the groups in that order
+seasonal["Season"] = pd.Categorical(seasonal["Season"], categories=seasons, ordered=True)
+seasonal = seasonal.sort_values(["Station", "Season", "Year"])
+
+print(f"📊 Calculating trends for {seasonal['Station'].nunique()} stations...")
+
+keys, series = [], []
+for (st, ss), data in seasonal.groupby(["Station", "Season"], sort=False, observed=True):
+    if len(data) < 10:
+        continue
+    rain = data["Rainfall"].to_numpy(dtype=float)
+    if np.all(np.isnan(rain)):
+        continue
+    keys.append((st, ss))
+    series.append(rain)
+
+# stack all series into one NaN-padded (G,T) matrix and test them together
+n_years = np.array([len(r) for r in series], dtype=int)
+rain_mat = np.full((len(series), n_years.max(initial=0)), np.nan)
+for g, rain in enumerate(series):
+    rain_mat[g, :len(rain)] = rain
+
+mk_tau, mk_p, mk_trend, sen = mann_kendall_batch(rain_mat)
 
-for st in stations:
-    for ss in seasons:
-        data = seasonal[(seasonal["Station"] == st) & (seasonal["Season"] == ss)]
-        if len(data) < 10:
-            continue
-        rain = data["Rainfall"].values
-        if np.all(np.isnan(rain)):
-            continue
-        mk_res = mk.original_test(rain)
-        results.append({
-            "Station": st,
-            "Season": ss,
-            "n_years": len(rain),
-            "MK_tau": mk_res.Tau,
-            "MK_p_value": mk_res.p,
-            "Trend": mk_res.trend,
-            "Sen_slope_mm_per_year": mk_res.slope if hasattr(mk_res, "slope") else np.nan,
-            "Mean_rainfall_mm": np.nanmean(rain)
-        })
+results = pd.DataFrame({
+    "Station": [st for st, _ in keys],
+    "Season": [ss for _, ss in keys],
+    "n_years": n_years,
+    "MK_tau": mk_tau,
+    "MK_p_value": mk_p,
+    "Trend": mk_trend,
+    "Sen_slope_mm_per_year": sen,
+    "Mean_rainfall_mm": np.nanmean(rain_mat, axis=1) if len(series) else []
+})
 
 # === 6. Save results ===
-res_df = pd.DataFrame(results)
 output_file = os.path.join(output_dir, "Trend_results_seasonal.csv")
-res_df.to_csv(output_file, index=False)
+results.to_csv(output_file, index=False)
 
 print(f"✅ Seasonal trend results saved at:\n{output_file}")
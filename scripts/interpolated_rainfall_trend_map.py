@@ -4,14 +4,25 @@
 # ======================================================
 
 import os
+import hashlib
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
+from shapely import wkb
 from shapely.geometry import Point
-from pyproj import Transformer
+from shapely.prepared import prep
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+from numba import njit, prange
+from rainfall_utils import normalize_columns
+
+try:
+    from shapely import box, contains_properly, contains_xy, intersects, prepare  # shapely >= 2.0
+except ImportError:
+    contains_xy = None
 
 # ---------------- USER SETTINGS ----------------
 base_dir = r"G:\Badhan --Study material  (Geology)\0 paper\0 Rainfall trend analysis\Rainfall 1989-2023"
@@ -22,7 +33,170 @@ shape_path = os.path.join(base_dir, "Districtdeg.shp")
 # IDW parameters
 power = 2.0                 # IDW power
 search_radius = 150000.0    # meters (set to None to use all stations for each cell)
+max_neighbors = None        # nearest stations used per cell (None => every station within search_radius)
 grid_resolution = 3000.0    # meters between grid cells (smaller => finer)
+use_cache = False           # reuse the interpolated grid when inputs and parameters are unchanged
+smooth_mesh = True          # gouraud-shaded mesh, colours symmetric around 0 (False => 20 contour levels over the data range)
+coverage_union = False      # dissolve districts with the faster coverage union (only if polygons share edges exactly)
+cache_dir = os.path.join(base_dir, "idw_cache")  # one file per cached step, overwritten when inputs change
+# ------------------------------------------------
+
+# part of every cache key: bump when the IDW / masking code changes so stale grids are not reused
+CACHE_VERSION = 1
+
+# ---------------- HELPERS ----------------
+# IDW on nearest-station neighbourhoods (KD-tree), split into
+# weights (depend only on grid + station positions) and their application to values
+@njit(parallel=True, fastmath=True, cache=True)
+def _idw_weights_kernel(dist, idx, N, power, eps, tol):
+    """
+    dist, idx: (M,k) KD-tree neighbour distances and station indices (idx == N => no neighbour)
+    tol: cells closer than tol to their nearest station take that station's value
+    returns w (M,k) row-normalised float32 weights (0 for missing neighbours)
+    """
+    M, k = dist.shape
+    w = np.zeros((M, k), dtype=np.float32)
+    for i in prange(M):
+        # exact station match -> take station value (neighbours are sorted, so check the first)
+        if k > 0 and idx[i, 0] < N and dist[i, 0] < tol:
+            w[i, 0] = 1.0
+            continue
+        wsum = 0.0
+        for j in range(k):
+            if idx[i, j] >= N:
+                break  # neighbours are sorted by distance, the rest are missing too
+            d = dist[i, j]
+            if power == 2.0:
+                wj = 1.0 / (d * d + eps)
+            else:
+                wj = 1.0 / (d ** power + eps)
+            w[i, j] = wj
+            wsum += wj
+        if wsum > 0:
+            for j in range(k):
+                w[i, j] = w[i, j] / wsum
+    return w
+
+def idw_weights(grid_pts, data_pts, power=2.0, radius=None, k=None, eps=1e-12, tol=1e-6):
+    """
+    grid_pts: (M,2) array of points to estimate
+    data_pts: (N,2) array of station coordinates
+    radius: if not None, only stations within radius (meters) are used
+    k: if not None, at most the k nearest stations are used
+    returns W: (M,N) sparse CSR matrix of row-normalised IDW weights
+               (an empty row means no station within radius)
+    """
+    M = grid_pts.shape[0]
+    N = data_pts.shape[0]
+    k = N if k is None else min(k, N)
+
+    # only stations within radius are returned; missing neighbours come back as (inf, N)
+    tree = cKDTree(data_pts)
+    dist, idx = tree.query(grid_pts, k=k, workers=-1,
+                           distance_upper_bound=np.inf if radius is None else radius)
+    dist = dist.reshape(M, k)
+    idx = idx.reshape(M, k)
+
+    w = _idw_weights_kernel(dist, idx, N, float(power), eps, tol)
+    W = csr_matrix((w.ravel(), np.minimum(idx, N - 1).ravel(), np.arange(0, M * k + 1, k)), shape=(M, N))
+    W.eliminate_zeros()  # drop the missing-neighbour slots
+    return W
+
+def idw_apply(W, data_vals):
+    """
+    W: (M,N) weights from idw_weights
+    data_vals: (N,) station values
+    returns z (M,) estimated values (NaN where no station is in range)
+    """
+    z = W @ np.asarray(data_vals)
+    z[np.diff(W.indptr) == 0] = np.nan
+    return z
+
+# Masking of grid points outside a polygon
+def points_in_polygon(geom, xs, ys, chunk=200000):
+    """
+    geom: shapely (Multi)Polygon
+    xs, ys: (M,) point coordinates
+    returns boolean (M,) array, True where the point lies inside geom
+    """
+    if contains_xy is None:
+        # shapely < 2.0: prepared geometry pre-indexes the polygon edges
+        prepared = prep(geom)
+        return np.array([prepared.contains(Point(px, py)) for px, py in zip(xs, ys)], dtype=bool)
+
+    inside = np.empty(xs.shape[0], dtype=bool)
+    for i0 in range(0, xs.shape[0], chunk):
+        i1 = min(xs.shape[0], i0 + chunk)
+        inside[i0:i1] = contains_xy(geom, xs[i0:i1], ys[i0:i1])
+    return inside
+
+def grid_in_polygon(geom, grid_x, grid_y, pad, block=8):
+    """
+    geom: shapely (Multi)Polygon
+    grid_x, grid_y: (nx,) and (ny,) grid axes; pad: half a grid cell
+    returns boolean (ny,nx) mask. Blocks of block x block cells that lie clearly
+    inside/outside geom are decided with one box test each; only the cells of
+    boundary blocks go through the exact point-in-polygon test.
+    """
+    gxx, gyy = np.meshgrid(grid_x, grid_y)
+    if contains_xy is None:
+        return points_in_polygon(geom, gxx.ravel(), gyy.ravel()).reshape(gxx.shape)
+
+    # coarse blocks, padded by half a cell so each box covers all of its cell centres
+    nx, ny = len(grid_x), len(grid_y)
+    c0 = np.arange(0, nx, block)
+    r0 = np.arange(0, ny, block)
+    c1 = np.minimum(c0 + block, nx) - 1
+    r1 = np.minimum(r0 + block, ny) - 1
+    bx0, by0 = np.meshgrid(grid_x[c0] - pad, grid_y[r0] - pad)
+    bx1, by1 = np.meshgrid(grid_x[c1] + pad, grid_y[r1] + pad)
+    blocks = box(bx0, by0, bx1, by1)
+
+    prepare(geom)
+    block_inside = contains_properly(geom, blocks)   # every cell centre strictly inside
+    block_edge = ~block_inside & intersects(geom, blocks)
+
+    # expand block status to the fine grid by integer indexing
+    rows = np.arange(ny)[:, None] // block
+    cols = np.arange(nx)[None, :] // block
+    mask = block_inside[rows, cols]
+    edge = block_edge[rows, cols]
+    mask[edge] = points_in_polygon(geom, gxx[edge], gyy[edge])
+    return mask
+
+def dissolve_boundary(gdf, coverage=False):
+    """
+    Single geometry covering all polygons in gdf.
+    coverage: try the linear-time coverage union first. It assumes the polygons
+    share their edges exactly and does not check for overlaps, so its result is
+    only kept when it is valid and its area equals the summed polygon areas
+    (true only for non-overlapping polygons); otherwise the general union is used.
+    """
+    if not hasattr(gdf, "union_all"):  # geopandas < 1.0
+        return gdf.unary_union
+    if coverage:
+        from shapely.errors import GEOSException  # geopandas >= 1.0 implies shapely >= 2.0
+        try:
+            geom = gdf.union_all(method="coverage")
+            if geom.is_valid and np.isclose(geom.area, gdf.area.sum(), rtol=1e-9):
+                return geom
+        except (GEOSException, AttributeError, TypeError, ValueError):  # method not supported by this geopandas/GEOS
+            pass
+    return gdf.union_all()
+
+def load_cached(path, key):
+    """arrays of an .npz cache file if it was written for key, else None"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as cached:
+        if cached["key"].item() != key:
+            return None
+        return {name: cached[name] for name in cached.files}
+
+def save_cached(path, key, **arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, key=key, **arrays)
+
 # ------------------------------------------------
 
 # --- 1. Load data
@@ -31,8 +205,8 @@ coords = pd.read_csv(coord_path, encoding='latin1', engine='python')
 gdf_bd = gpd.read_file(shape_path)  # boundary (district polygons)
 
 # Normalize column names
-trend.columns = [c.strip().capitalize() for c in trend.columns]
-coords.columns = [c.strip().capitalize() for c in coords.columns]
+normalize_columns(trend)
+normalize_columns(coords)
 
 # Merge trend + coords
 df = pd.merge(trend, coords, on="Station", how="left")
@@ -52,96 +226,78 @@ gdf_st_proj = gdf_st.to_crs(crs_proj)
 minx, miny, maxx, maxy = gdf_bd_proj.total_bounds
 print(f"Projected bounds (meters): {minx:.0f}, {miny:.0f}, {maxx:.0f}, {maxy:.0f}")
 
-# --- 4. Create regular grid in projected coords
-nx = int(np.ceil((maxx - minx) / grid_resolution)) + 1
-ny = int(np.ceil((maxy - miny) / grid_resolution)) + 1
-grid_x = np.linspace(minx, maxx, nx)
-grid_y = np.linspace(miny, maxy, ny)
-gx, gy = np.meshgrid(grid_x, grid_y)
-
-# Flatten grid points for computation
-grid_points = np.vstack((gx.ravel(), gy.ravel())).T
-
-# --- 5. Prepare station coords and values
-stations_xy = np.vstack((gdf_st_proj.geometry.x.values, gdf_st_proj.geometry.y.values)).T
-values = gdf_st_proj["Sen_slope_mm_per_year"].values
-
-# --- 6. Fixed IDW implementation with chunking
-def idw_interpolation(grid_pts, data_pts, data_vals, power=2.0, radius=None, chunk=20000, eps=1e-12):
-    """
-    grid_pts: (M,2) array of points to estimate
-    data_pts: (N,2) array of station coordinates
-    data_vals: (N,) station values
-    radius: if not None, only stations within radius (meters) are used
-    returns z (M,) estimated values
-    """
-    M = grid_pts.shape[0]
-    N = data_pts.shape[0]
-    z = np.full(M, np.nan, dtype=float)
-
-    for i0 in range(0, M, chunk):
-        i1 = min(M, i0 + chunk)
-        gp = grid_pts[i0:i1]  # (K,2)
-        # compute distances (K,N)
-        dx = gp[:, 0:1] - data_pts[:, 0][None, :]
-        dy = gp[:, 1:2] - data_pts[:, 1][None, :]
-        dist = np.hypot(dx, dy)  # (K,N)
-
-        # exact station match -> take station value
-        exact = dist < 1e-6
-        any_exact = exact.any(axis=1)
-        if any_exact.any():
-            idxs = np.where(any_exact)[0]
-            for j in idxs:
-                z[i0 + j] = data_vals[exact[j, :]][0]
-
-        # Apply radius mask (if provided)
-        if radius is not None:
-            mask_within = dist <= radius
-            dist_masked = np.where(mask_within, dist, np.nan)
-        else:
-            mask_within = np.ones_like(dist, dtype=bool)
-            dist_masked = dist.copy()
-
-        # Compute weights: 1 / dist^power
-        with np.errstate(divide='ignore', invalid='ignore'):
-            w = 1.0 / (np.power(dist_masked, power) + eps)
-
-        # sum weights per grid point
-        w_sum = np.nansum(w, axis=1)  # length K
-
-        # valid grid points which have at least one neighbor within radius (or any if radius is None)
-        valid = w_sum > 0
-
-        if valid.any():
-            # compute weighted sums for valid rows
-            weighted = np.nansum(w[valid, :] * data_vals[None, :], axis=1)  # length = num_valid
-            z_chunk = np.full(gp.shape[0], np.nan)
-            z_chunk[valid] = weighted / w_sum[valid]
-            z[i0:i1] = z_chunk
-
-    return z
-
-# Run IDW (this will fill grid cells depending on radius)
-idw_z = idw_interpolation(grid_points, stations_xy, values, power=power, radius=search_radius, chunk=20000)
-zi = idw_z.reshape(gx.shape)
-
-# --- 7. Mask grid points outside Bangladesh polygon (projected)
-# create shapely mask using unary_union for performance
-bd_union = gdf_bd_proj.unary_union
-inside_mask = np.array([bd_union.contains(Point(px, py)) for px, py in grid_points])
-zi_masked = np.where(inside_mask.reshape(gx.shape), zi, np.nan)
-
-# --- 8. Transform masked grid back to lon/lat for plotting
-transformer = Transformer.from_crs(crs_proj, "EPSG:4326", always_xy=True)
-pts_proj = np.vstack((gx.ravel(), gy.ravel())).T
-lon, lat = transformer.transform(pts_proj[:, 0], pts_proj[:, 1])
-lon_grid = lon.reshape(gx.shape)
-lat_grid = lat.reshape(gx.shape)
-
-# --- 9. Plot with Cartopy
+# --- 4-7. Grid, IDW and mask (cached on input mtimes + parameters)
+cache_key = hashlib.sha1(repr((
+    os.path.getmtime(trend_path), os.path.getmtime(coord_path), os.path.getmtime(shape_path),
+    crs_proj, power, search_radius, max_neighbors, grid_resolution, coverage_union, CACHE_VERSION,
+)).encode()).hexdigest()
+cache_path = os.path.join(cache_dir, "idw_grid.npz")
+
+cached = load_cached(cache_path, cache_key) if use_cache else None
+if cached is not None:
+    print("Loading cached IDW grid:", cache_path)
+    gx, gy, zi_masked = cached["gx"], cached["gy"], cached["zi"]
+else:
+    # --- 4. Create regular grid in projected coords
+    nx = int(np.ceil((maxx - minx) / grid_resolution)) + 1
+    ny = int(np.ceil((maxy - miny) / grid_resolution)) + 1
+    grid_x = np.linspace(minx, maxx, nx)
+    grid_y = np.linspace(miny, maxy, ny)
+    gx, gy = np.meshgrid(grid_x, grid_y)
+
+    # Flatten grid points for computation
+    # float32 halves the bytes moved; offsets from the grid origin keep sub-metre precision
+    origin = np.array([minx, miny])
+    grid_points = (np.vstack((gx.ravel(), gy.ravel())).T - origin).astype(np.float32)
+
+    # --- 5. Prepare station coords and values
+    stations_xy = (np.vstack((gdf_st_proj.geometry.x.values, gdf_st_proj.geometry.y.values)).T - origin).astype(np.float32)
+    values = gdf_st_proj["Sen_slope_mm_per_year"].to_numpy(dtype=np.float32)
+
+    # --- 6. Run IDW (this will fill grid cells depending on radius)
+    # weights depend only on the grid and station positions, so any set of station
+    # values (e.g. each season's slopes) can reuse them; they are kept on disk too
+    weights_key = hashlib.sha1(repr((
+        minx, miny, maxx, maxy, grid_resolution, stations_xy.tobytes(),
+        power, search_radius, max_neighbors, CACHE_VERSION,
+    )).encode()).hexdigest()
+    weights_path = os.path.join(cache_dir, "idw_weights.npz")
+    cached = load_cached(weights_path, weights_key) if use_cache else None
+    if cached is not None:
+        print("Loading cached IDW weights:", weights_path)
+        W = csr_matrix((cached["data"], cached["indices"], cached["indptr"]), shape=tuple(cached["shape"]))
+    else:
+        W = idw_weights(grid_points, stations_xy, power=power, radius=search_radius, k=max_neighbors)
+        if use_cache:
+            save_cached(weights_path, weights_key, data=W.data, indices=W.indices, indptr=W.indptr,
+                        shape=np.array(W.shape))
+
+    idw_z = idw_apply(W, values)
+    zi = idw_z.reshape(gx.shape)
+
+    # --- 7. Mask grid points outside Bangladesh polygon (projected)
+    # dissolve districts into the country outline; kept on disk as WKB (the shapefile rarely changes)
+    union_key = hashlib.sha1(repr((
+        os.path.getmtime(shape_path), crs_proj, coverage_union, CACHE_VERSION,
+    )).encode()).hexdigest()
+    union_path = os.path.join(cache_dir, "boundary_union.npz")
+    cached = load_cached(union_path, union_key) if use_cache else None
+    if cached is not None:
+        bd_union = wkb.loads(cached["wkb"].tobytes())
+    else:
+        bd_union = dissolve_boundary(gdf_bd_proj, coverage=coverage_union)
+        if use_cache:
+            save_cached(union_path, union_key, wkb=np.frombuffer(bd_union.wkb, dtype=np.uint8))
+    inside_mask = grid_in_polygon(bd_union, grid_x, grid_y, pad=grid_resolution / 2)
+    zi_masked = np.where(inside_mask, zi, np.nan)
+
+    if use_cache:
+        save_cached(cache_path, cache_key, zi=zi_masked, gx=gx, gy=gy)
+
+# --- 8. Plot with Cartopy directly in the projected CRS (no inverse transform of the grid)
+map_crs = ccrs.epsg(int(crs_proj.split(":")[1]))
 fig = plt.figure(figsize=(9, 10))
-ax = plt.axes(projection=ccrs.PlateCarree())
+ax = plt.axes(projection=map_crs)
 pad_deg = 0.2
 ax.set_extent([gdf_bd.total_bounds[0] - pad_deg, gdf_bd.total_bounds[2] + pad_deg,
                gdf_bd.total_bounds[1] - pad_deg, gdf_bd.total_bounds[3] + pad_deg],
@@ -152,10 +308,18 @@ ax.add_feature(cfeature.COASTLINE, linewidth=0.5)
 ax.add_feature(cfeature.BORDERS, linewidth=0.5)
 ax.add_feature(cfeature.RIVERS, linewidth=0.3)
 
-cf = ax.contourf(lon_grid, lat_grid, zi_masked, cmap="RdBu_r", levels=20, transform=ccrs.PlateCarree())
-
-# overlay district boundary (lon/lat)
-gdf_bd.boundary.plot(ax=ax, color="black", linewidth=0.6, zorder=3)
+if smooth_mesh:
+    # gouraud-shaded mesh: smooth field without tracing contour levels; symmetric range around 0
+    vmax = np.nanmax(np.abs(zi_masked)) if np.isfinite(zi_masked).any() else np.nan
+    if not np.isfinite(vmax) or vmax == 0:  # empty or all-zero field
+        vmax = 1.0
+    cf = ax.pcolormesh(gx, gy, np.ma.masked_invalid(zi_masked), cmap="RdBu_r", shading="gouraud",
+                       vmin=-vmax, vmax=vmax, transform=map_crs)
+else:
+    cf = ax.contourf(gx, gy, zi_masked, cmap="RdBu_r", levels=20, transform=map_crs)
+
+# overlay district boundary (projected, same CRS as the axes)
+gdf_bd_proj.boundary.plot(ax=ax, color="black", linewidth=0.6, zorder=3)
 
 # station points (lon/lat)
 ax.scatter(gdf_st.geometry.x, gdf_st.geometry.y, color="k", s=25, edgecolor="white", transform=ccrs.PlateCarree(), zorder=4)
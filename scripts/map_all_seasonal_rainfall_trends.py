@@ -12,6 +12,7 @@ import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import matplotlib.lines as mlines
 import os
+from rainfall_utils import normalize_columns
 
 # === 1. File paths ===
 trend_path = r"G:\Badhan --Study material  (Geology)\0 paper\0 Rainfall trend analysis\Rainfall 1989-2023\Trend_results_seasonal.csv"
@@ -23,8 +24,8 @@ trend = pd.read_csv(trend_path, encoding='utf-8')
 coords = pd.read_csv(coord_path, encoding='latin1', engine='python')
 
 # Clean column names
-trend.columns = [c.strip().capitalize() for c in trend.columns]
-coords.columns = [c.strip().capitalize() for c in coords.columns]
+normalize_columns(trend)
+normalize_columns(coords)
 
 # Merge coordinates
 merged = pd.merge(trend, coords, on="Station", how="left")
@@ -49,8 +50,36 @@ season_months = {
 # Compute symmetric color range (same for all maps)
 vmax = abs(gdf["Sen_slope_mm_per_year"]).max()
 
-# === 4. Loop through seasons and create maps ===
+# === 4. Build the base map once (shared by all seasons) ===
 output_dir = os.path.dirname(trend_path)
+fig = plt.figure(figsize=(9, 10))
+ax = plt.axes(projection=ccrs.PlateCarree())
+ax.set_extent([87, 93, 20, 27], crs=ccrs.PlateCarree())
+
+# Add background features
+ax.add_feature(cfeature.LAND, facecolor="lightgray")
+ax.add_feature(cfeature.COASTLINE, linewidth=0.5)
+ax.add_feature(cfeature.BORDERS, linewidth=0.5)
+ax.add_feature(cfeature.RIVERS, linewidth=0.3)
+ax.gridlines(draw_labels=True, linewidth=0.2, color='gray', alpha=0.5)
+
+# Legend for significance
+sig_marker = mlines.Line2D([], [], color='black', marker='o', linestyle='None',
+                           markersize=8, label='Significant (p < 0.05)')
+ax.legend(handles=[sig_marker], loc='lower left', fontsize=8, frameon=True)
+
+# Months info on map (top-left corner), text set per season
+months_text = ax.text(
+    87.2, 26.6, "",
+    fontsize=9,
+    fontweight='bold',
+    bbox=dict(facecolor='white', alpha=0.6, edgecolor='none'),
+    transform=ccrs.PlateCarree()
+)
+
+cbar = None
+
+# === 5. Loop through seasons and draw only the station layers ===
 for selected_season in seasons:
     print(f"📊 Generating map for: {selected_season}")
 
@@ -59,18 +88,6 @@ for selected_season in seasons:
         print(f"⚠️ No data for {selected_season}, skipping.")
         continue
 
-    # === 5. Create map ===
-    fig = plt.figure(figsize=(9, 10))
-    ax = plt.axes(projection=ccrs.PlateCarree())
-    ax.set_extent([87, 93, 20, 27], crs=ccrs.PlateCarree())
-
-    # Add background features
-    ax.add_feature(cfeature.LAND, facecolor="lightgray")
-    ax.add_feature(cfeature.COASTLINE, linewidth=0.5)
-    ax.add_feature(cfeature.BORDERS, linewidth=0.5)
-    ax.add_feature(cfeature.RIVERS, linewidth=0.3)
-    ax.gridlines(draw_labels=True, linewidth=0.2, color='gray', alpha=0.5)
-
     # === 6. Plot Sen’s slope ===
     sc = ax.scatter(
         df_season["Longitude"],
@@ -84,48 +101,43 @@ for selected_season in seasons:
 
     # Highlight significant (p < 0.05)
     sig = df_season[df_season["Mk_p_value"] < 0.05]
-    ax.scatter(sig["Longitude"], sig["Latitude"],
-               facecolors='none', edgecolors='black',
-               s=220, linewidth=1.4, transform=ccrs.PlateCarree())
+    sig_sc = ax.scatter(sig["Longitude"], sig["Latitude"],
+                        facecolors='none', edgecolors='black',
+                        s=220, linewidth=1.4, transform=ccrs.PlateCarree())
 
     # === 7. Add station labels ===
+    labels = []
     for _, row in df_season.iterrows():
-        ax.text(row["Longitude"] + 0.05, row["Latitude"] + 0.05,
-                row["Station"], fontsize=7, transform=ccrs.PlateCarree())
+        labels.append(ax.text(row["Longitude"] + 0.05, row["Latitude"] + 0.05,
+                              row["Station"], fontsize=7, transform=ccrs.PlateCarree()))
 
-    # === 8. Colorbar & legend ===
-    cbar = plt.colorbar(sc, ax=ax, orientation="vertical", shrink=0.8, pad=0.07)
-    cbar.set_label("Sen’s slope (mm/year)", fontsize=10)
-
-    sig_marker = mlines.Line2D([], [], color='black', marker='o', linestyle='None',
-                               markersize=8, label='Significant (p < 0.05)')
-    ax.legend(handles=[sig_marker], loc='lower left', fontsize=8, frameon=True)
+    # === 8. Colorbar (same range for every season, so create it once) ===
+    if cbar is None:
+        cbar = plt.colorbar(sc, ax=ax, orientation="vertical", shrink=0.8, pad=0.07)
+        cbar.set_label("Sen’s slope (mm/year)", fontsize=10)
 
     # === 9. Add title and months text ===
-    plt.title(
+    ax.set_title(
         f"{selected_season} Rainfall Trend in Bangladesh (1989–2023)\n"
         "Analysis: Mann–Kendall & Sen’s slope",
         fontsize=12,
         pad=10
     )
-
-    # Add months info on map (top-left corner)
-    ax.text(
-        87.2, 26.6,
-        f"Months: {season_months.get(selected_season, '')}",
-        fontsize=9,
-        fontweight='bold',
-        bbox=dict(facecolor='white', alpha=0.6, edgecolor='none'),
-        transform=ccrs.PlateCarree()
-    )
+    months_text.set_text(f"Months: {season_months.get(selected_season, '')}")
 
     plt.tight_layout(rect=[0, 0, 1, 0.95])
 
     # === 10. Save map ===
     output_file = os.path.join(output_dir, f"Rainfall_Trend_Map_{selected_season}_1989_2023.png")
-    plt.savefig(output_file, dpi=500, bbox_inches='tight')
-    plt.close(fig)
+    fig.savefig(output_file, dpi=500, bbox_inches='tight')
+
+    # remove this season's layers, keep the base map for the next one
+    sc.remove()
+    sig_sc.remove()
+    for t in labels:
+        t.remove()
 
     print(f"✅ Saved: {output_file}")
 
+plt.close(fig)
 print("🎯 All four seasonal maps created successfully!")
@@ -12,6 +12,7 @@ import cartopy.feature as cfeature
 import matplotlib.lines as mlines
 from adjustText import adjust_text
 import os
+from rainfall_utils import normalize_columns
 
 # === 1. File paths ===
 trend_path = r"G:\Badhan --Study material  (Geology)\0 paper\0 Rainfall trend analysis\Rainfall 1989-2023\Trend_results_stations.csv"
@@ -23,8 +24,8 @@ trend = pd.read_csv(trend_path, encoding='utf-8')
 coords = pd.read_csv(coord_path, encoding='latin1', engine='python')
 
 # Clean column names
-trend.columns = [c.strip().capitalize() for c in trend.columns]
-coords.columns = [c.strip().capitalize() for c in coords.columns]
+normalize_columns(trend)
+normalize_columns(coords)
 
 # Validate required columns
 if not {"Station", "Latitude", "Longitude"}.issubset(coords.columns):
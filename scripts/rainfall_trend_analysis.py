@@ -6,63 +6,80 @@
 
 import pandas as pd
 import numpy as np
-import pymannkendall as mk
-from scipy.stats import linregress
+from scipy.stats import t as t_dist
 import os
+from rainfall_utils import mann_kendall_batch, normalize_columns
 
 # === 1. Set file path ===
-input_path = r"G:\Badhan --Study material  (Geology)\0 paper\0 Rainfall trend analysis\Rainfall 1989-2023\Rainfall_annual_1989_2023.csv"
+input_path = r"G:\Badhan --Study material  (Geology)\0 paper\0 Rainfall trend analysis\Rainfall 1989-2023\Rainfall_annual_1989_2023.parquet"
 
 # === 2. Load the dataset ===
 print("🔹 Reading annual rainfall data...")
-df = pd.read_csv(input_path)
+df = pd.read_parquet(input_path)
 
 # Ensure proper column names
-df.columns = [c.strip().capitalize() for c in df.columns]
+normalize_columns(df)
 
 # Check required columns
 required_cols = {"Station", "Year", "Rainfall"}
 if not required_cols.issubset(df.columns):
     raise ValueError(f"❌ Missing columns! Found: {list(df.columns)}")
 
+# narrow dtypes by the normalized names (no-op for the aggregate_rainfall.py parquet)
+df = df.astype({"Station": "category", "Year": "int16"})
+
 # Sort data
 df = df.sort_values(["Station", "Year"]).dropna(subset=["Rainfall"])
 
 # === 3. Run Mann–Kendall and Sen’s slope per station ===
-results = []
-stations = df["Station"].unique()
-
-print(f"📈 Running trend analysis for {len(stations)} stations...")
+print(f"📈 Running trend analysis for {df['Station'].nunique()} stations...")
 
-for st in stations:
-    data = df[df["Station"] == st]
-    years = data["Year"].values
-    rain = data["Rainfall"].values
-
-    if len(rain) < 10:
+# df is already sorted by Station/Year, so each group comes out in year order
+stations, years_list, rain_list = [], [], []
+for st, data in df.groupby("Station", sort=False, observed=True):
+    if len(data) < 10:
         continue  # skip short series
+    stations.append(st)
+    years_list.append(data["Year"].to_numpy(dtype=float))
+    rain_list.append(data["Rainfall"].to_numpy(dtype=float))
+
+# stack all series into NaN-padded (stations x years) matrices and test them together
+n_years = np.array([len(r) for r in rain_list], dtype=int)
+rain_mat = np.full((len(rain_list), n_years.max(initial=0)), np.nan)
+year_mat = np.full_like(rain_mat, np.nan)
+for g, (yrs, rain) in enumerate(zip(years_list, rain_list)):
+    rain_mat[g, :len(rain)] = rain
+    year_mat[g, :len(yrs)] = yrs
 
-    # Mann-Kendall test
-    mk_result = mk.original_test(rain)
-    slope = mk_result.slope if hasattr(mk_result, 'slope') else np.nan
+# Mann-Kendall test + Sen's slope (same statistics as pymannkendall.original_test)
+mk_tau, mk_p, mk_trend, sen = mann_kendall_batch(rain_mat)
 
-    # Linear regression (for comparison)
-    lr = linregress(years, rain)
+# Linear regression (for comparison): least squares per row, padding masked out
+with np.errstate(divide="ignore", invalid="ignore"):
+    dx = year_mat - np.nanmean(year_mat, axis=1, keepdims=True)
+    dy = rain_mat - np.nanmean(rain_mat, axis=1, keepdims=True)
+    sxx = np.nansum(dx * dx, axis=1)
+    syy = np.nansum(dy * dy, axis=1)
+    sxy = np.nansum(dx * dy, axis=1)
+    lin_slope = sxy / sxx
+    r = np.clip(sxy / np.sqrt(sxx * syy), -1.0, 1.0)
+    dof = n_years - 2
+    t_stat = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+lin_p = 2 * t_dist.sf(np.abs(t_stat), dof)
 
-    results.append({
-        "Station": st,
-        "n_years": len(rain),
-        "MK_tau": mk_result.Tau,
-        "MK_p_value": mk_result.p,
-        "Trend": mk_result.trend,
-        "Sen_slope_mm_per_year": slope,
-        "Linear_slope_mm_per_year": lr.slope,
-        "Linear_p_value": lr.pvalue,
-        "Mean_rainfall_mm": np.mean(rain)
-    })
+results_df = pd.DataFrame({
+    "Station": stations,
+    "n_years": n_years,
+    "MK_tau": mk_tau,
+    "MK_p_value": mk_p,
+    "Trend": mk_trend,
+    "Sen_slope_mm_per_year": sen,
+    "Linear_slope_mm_per_year": lin_slope,
+    "Linear_p_value": lin_p,
+    "Mean_rainfall_mm": np.nanmean(rain_mat, axis=1) if len(rain_list) else []
+})
 
 # === 4. Save results ===
-results_df = pd.DataFrame(results)
 output_dir = os.path.dirname(input_path)
 output_path = os.path.join(output_dir, "Trend_results_stations.csv")
 results_df.to_csv(output_path, index=False)
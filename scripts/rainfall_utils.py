@@ -0,0 +1,65 @@
+# ======================================================
+# Shared helpers for the rainfall trend scripts
+# Purpose: small utilities imported by the scripts in
+#          this folder (run them from here or via path)
+# ======================================================
+
+import numpy as np
+from scipy.stats import norm
+
+
+def normalize_columns(df):
+    """Strip and capitalize column names in place (" station" -> "Station")."""
+    cols = df.columns.str.strip().str.capitalize()
+    if not cols.equals(df.columns):
+        df.columns = cols
+    return df
+
+
+def _tie_term(x):
+    """
+    sum of tp*(tp-1)*(2*tp+5) over the groups of tied values in each row of x
+    (all rows at once: sort, then count run lengths; NaN never ties)
+    """
+    G, T = x.shape
+    xs = np.sort(x, axis=1)                    # NaN sorts last
+    start = np.ones((G, T), dtype=bool)        # first element of each run of equal values
+    start[:, 1:] = xs[:, 1:] != xs[:, :-1]
+    run = np.cumsum(start.ravel()) - 1         # run id of every element, runs never cross rows
+    tp = np.bincount(run, weights=~np.isnan(xs.ravel()))  # run lengths (NaN runs count 0)
+    run_row = np.repeat(np.arange(G), T)[start.ravel()]
+    return np.bincount(run_row, weights=tp * (tp - 1) * (2 * tp + 5), minlength=G)
+
+
+def mann_kendall_batch(x, alpha=0.05):
+    """
+    Mann-Kendall test + Sen's slope for many series at once
+    (same statistics as pymannkendall.original_test).
+
+    x: (G,T) array, one series per row; NaN marks a missing value
+       (pairs involving it are skipped, column index is the time step)
+    returns tau, p, trend, sen_slope arrays of length G
+    """
+    G, T = x.shape
+    i, j = np.triu_indices(T, 1)      # every pair i < j, upper triangle only
+    diffs = x[:, j] - x[:, i]          # (G, T(T-1)/2), NaN where a value is missing
+    n = np.sum(~np.isnan(x), axis=1)
+
+    # S statistic and its variance (with tie correction)
+    s = np.nansum(np.sign(diffs), axis=1)
+    var_s = (n * (n - 1) * (2 * n + 5)).astype(float)
+    var_s -= _tie_term(x)
+    var_s /= 18
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(s > 0, (s - 1) / np.sqrt(var_s),
+                     np.where(s < 0, (s + 1) / np.sqrt(var_s), 0.0))
+        tau = s / (0.5 * n * (n - 1))
+    p = 2 * (1 - norm.cdf(np.abs(z)))
+    h = np.abs(z) > norm.ppf(1 - alpha / 2)
+    trend = np.where(h & (z > 0), "increasing",
+                     np.where(h & (z < 0), "decreasing", "no trend"))
+
+    # Sen's slope: median of the pairwise slopes per time step
+    sen = np.nanmedian(diffs / (j - i), axis=1)
+    return tau, p, trend, sen
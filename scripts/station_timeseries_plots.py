@@ -6,22 +6,33 @@ with Mann-Kendall & Sen's slope annotations.
 
 Outputs:
  - <Station>_annual_timeseries.png
- - optionally <Station>_monthly_timeseries.png
+ - optionally <Station>_monthly_timeseries.png (.pdf with monthly_format = "pdf")
+ - or, with combined_figure = True, one <Station>_timeseries.png with both panels
 
 Edit the input paths and stations_to_plot list below if needed.
 """
 
 import os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # files only; also keeps worker processes off any GUI backend
 import matplotlib.pyplot as plt
-from scipy.stats import linregress
-import pymannkendall as mk
+import matplotlib.dates as mdates
+from numba import njit
+from rainfall_utils import mann_kendall_batch, normalize_columns
+
+try:
+    import bottleneck as bn  # fast moving-window kernels (optional)
+except ImportError:
+    bn = None
 
 # ---------- User settings ----------
 base_dir = r"G:\Badhan --Study material  (Geology)\0 paper\0 Rainfall trend analysis\Rainfall 1989-2023"
-annual_csv = os.path.join(base_dir, "Rainfall_annual_1989_2023.csv")
-monthly_csv = os.path.join(base_dir, "Rainfall_monthly_1989_2023.csv")  # optional
+annual_path = os.path.join(base_dir, "Rainfall_annual_1989_2023.parquet")
+monthly_path = os.path.join(base_dir, "Rainfall_monthly_1989_2023.parquet")  # optional
 trend_csv = os.path.join(base_dir, "Trend_results_stations.csv")
 
 # Stations to plot:
@@ -31,138 +42,335 @@ stations_to_plot = "all"
 
 # Plot options
 plot_monthly = True      # set False to skip monthly plots
+pad_to_full_period = False  # True => every monthly plot spans the whole record, not just the station's own months
 save_png = True
-output_dir = base_dir
+output_dir = Path(base_dir)
 dpi = 300
+raster_dpi = 150         # dpi of the monthly PNGs (dense lines, a screen-QA resolution is enough)
+monthly_format = "png"   # "pdf" => vector axes/text with the data lines rasterized at dpi
+combined_figure = False  # True => one <Station>_timeseries.png with both panels (at dpi) instead of two files
+n_workers = None         # processes drawing stations in parallel (None => all cores)
 # ---------- end user settings ----------
 
-# Utility: compute Sen's slope (median of pairwise slopes)
+@njit(cache=True)
 def sens_slope(years, values):
-    # years and values are 1D numpy arrays, length n
+    """Sen's slope: median of the pairwise slopes (pairs with equal years skipped), NaN if any value is NaN."""
     n = len(values)
-    if n < 2:
-        return np.nan
-    slopes = []
+    if not np.all(np.isfinite(values)):
+        return np.nan  # as np.median / theilslopes would
+    slopes = np.empty(n * (n - 1) // 2, dtype=np.float64)
+    m = 0
     for i in range(n - 1):
         for j in range(i + 1, n):
-            denom = (years[j] - years[i])
-            if denom != 0:
-                slopes.append((values[j] - values[i]) / denom)
-    if len(slopes) == 0:
+            dx = years[j] - years[i]
+            if dx != 0:
+                slopes[m] = (values[j] - values[i]) / dx
+                m += 1
+    if m == 0:
         return np.nan
-    return float(np.median(slopes))
-
-# Load data
-print("Loading CSVs...")
-df_ann = pd.read_csv(annual_csv)        # expects columns: Station, Year, Rainfall
-df_ann.columns = [c.strip().capitalize() for c in df_ann.columns]
-
-# Check monthly file only if plotting monthly
-if plot_monthly:
-    try:
-        df_mon = pd.read_csv(monthly_csv)  # expects Station, Year, Month, Rainfall
-        df_mon.columns = [c.strip().capitalize() for c in df_mon.columns]
-        # create a Date column for monthly series
-        if "Year" in df_mon.columns and "Month" in df_mon.columns:
-            df_mon["Date"] = pd.to_datetime(df_mon["Year"].astype(int).astype(str) + "-" + df_mon["Month"].astype(int).astype(str) + "-01")
-    except Exception as e:
-        print("Warning: monthly CSV could not be loaded or parsed. Skipping monthly plots.")
-        print(e)
-        plot_monthly = False
-
-# Station list
-stations = sorted(df_ann["Station"].unique())
-print(f"Found {len(stations)} stations.")
-
-# If user set stations_to_plot == "all", use all; else verify provided names
-if isinstance(stations_to_plot, str) and stations_to_plot.lower() == "all":
-    selected = stations
-else:
-    # assume list
-    selected = [s for s in stations_to_plot if s in stations]
-    if not selected:
-        print("No valid stations specified in stations_to_plot. Falling back to all stations.")
-        selected = stations
+    # median by selection (partition) rather than a full sort
+    k = m // 2
+    part = np.partition(slopes[:m], k)
+    if m % 2 == 1:
+        return part[k]
+    return 0.5 * (part[k] + np.max(part[:k]))
+
+@njit(cache=True)
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of n_out points that keep
+    the visual shape of the line (first and last point always kept).
+    A NaN is only picked when its whole bucket is NaN (so long gaps stay gaps), and the
+    triangle anchor is always the last finite point picked.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[n_out - 1] = n - 1
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # average of the next bucket is the third triangle corner
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        avg_x = np.mean(x[end:nxt_end])
+        avg_y = np.nanmean(y[end:nxt_end])
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            if np.isnan(y[j]):
+                continue
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if np.isnan(area):  # no finite anchor yet or an all-NaN next bucket
+                area = 0.0
+            if area > best_area:
+                best, best_area = j, area
+        idx[i + 1] = best
+        if not np.isnan(y[best]):
+            a = best
+    return idx
+
+# one figure per plot type and process, built once with its artists; every station
+# only swaps the data and the texts (constrained layout keeps labels inside the canvas,
+# so saving needs no tight-bbox pass)
+_figures = {}
+
+def annual_artists(ax):
+    artists = {
+        # single-colour markers via plot (Line2D fast path); ms is a diameter, scatter's s=30 an area
+        "points": ax.plot([], [], marker="o", linestyle="none", ms=np.sqrt(30), color="tab:blue",
+                          label="Annual rainfall")[0],
+        "linear": ax.plot([], [], color="orange", lw=1.8, label="Linear fit")[0],
+        "sen": ax.plot([], [], color="red", lw=1.6, linestyle="--", label="Sen's slope")[0],
+        # annotation for MK
+        "text": ax.text(0.02, 0.95, "", transform=ax.transAxes, va="top", fontsize=9,
+                        bbox=dict(facecolor="white", alpha=0.7, edgecolor="none")),
+    }
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Annual rainfall (mm)")
+    ax.grid(alpha=0.3)
+    artists["legend"] = ax.legend(loc="lower left", fontsize=9)
+    return artists
 
-# Create plots
-for st in selected:
-    print(f"Plotting station: {st}")
-    s_ann = df_ann[df_ann["Station"] == st].sort_values("Year")
-    if s_ann.empty:
-        print(f"  -> No annual data for {st}, skipping.")
-        continue
-
-    years = s_ann["Year"].astype(int).values
-    rain = s_ann["Rainfall"].astype(float).values
-
-    # Mann-Kendall test (on annual totals)
-    try:
-        mk_res = mk.original_test(rain)
-        mk_trend = mk_res.trend
-        mk_p = mk_res.p
-        mk_tau = mk_res.Tau
-    except Exception:
-        mk_res = None
-        mk_trend = "unknown"
-        mk_p = np.nan
-        mk_tau = np.nan
+def monthly_artists(ax):
+    ax.xaxis_date()  # lines are fed matplotlib date numbers
+    artists = {
+        "monthly": ax.plot([], [], color="lightgray", lw=0.6, label="Monthly rainfall", rasterized=True)[0],
+        "roll12": ax.plot([], [], color="tab:blue", lw=1.6, label="12-mo rolling mean", rasterized=True)[0],
+    }
+    ax.set_ylabel("Rainfall (mm)")
+    ax.set_xlabel("Date")
+    ax.grid(alpha=0.25)
+    artists["legend"] = ax.legend(fontsize=9)
+    return artists
+
+def get_figure(kind):
+    """returns (fig, [(ax, artists), ...]) for kind "annual", "monthly" or "combined", created on first use"""
+    if kind not in _figures:
+        if kind == "annual":
+            fig, ax = plt.subplots(figsize=(8, 4.2), constrained_layout=True)
+            panels = [(ax, annual_artists(ax))]
+        elif kind == "monthly":
+            fig, ax2 = plt.subplots(figsize=(10, 3.2), constrained_layout=True)
+            panels = [(ax2, monthly_artists(ax2))]
+        else:
+            fig, (ax, ax2) = plt.subplots(2, 1, figsize=(10, 7.4), constrained_layout=True)
+            panels = [(ax, annual_artists(ax)), (ax2, monthly_artists(ax2))]
+        _figures[kind] = (fig, panels)
+    return _figures[kind]
+
+def draw_annual(ax, art, st, years, rain, slope, intercept, mk_stats):
+    mk_trend, mk_p, mk_tau = mk_stats
 
     # Linear regression (for visual reference)
-    lr = linregress(years, rain)
-    lin_y = lr.intercept + lr.slope * years
+    lin_y = intercept + slope * years
 
     # Sen's slope (median of pairwise slopes)
     sen = sens_slope(years, rain)
     # build a Sen's line for plotting
     sen_line = sen * (years - years[0]) + rain[0]
 
-    # --- Plot annual series ---
-    fig, ax = plt.subplots(figsize=(8, 4.2))
-    ax.scatter(years, rain, s=30, color="tab:blue", label="Annual rainfall")
-    ax.plot(years, lin_y, color="orange", lw=1.8, label=f"Linear fit (slope={lr.slope:.2f} mm/yr)")
-    ax.plot(years, sen_line, color="red", lw=1.6, linestyle="--", label=f"Sen's slope={sen:.2f} mm/yr")
-    ax.set_xlabel("Year")
-    ax.set_ylabel("Annual rainfall (mm)")
+    art["points"].set_data(years, rain)
+    art["linear"].set_data(years, lin_y)
+    art["sen"].set_data(years, sen_line)
+    legend_texts = art["legend"].get_texts()
+    legend_texts[1].set_text(f"Linear fit (slope={slope:.2f} mm/yr)")
+    legend_texts[2].set_text(f"Sen's slope={sen:.2f} mm/yr")
+    art["text"].set_text(f"Mann–Kendall: {mk_trend}\nTau={mk_tau:.3f}, p={mk_p:.3f}")
     ax.set_title(f"{st} — Annual rainfall (1989–2023)")
-    # annotation for MK
-    ann_text = f"Mann–Kendall: {mk_trend}\nTau={mk_tau:.3f}, p={mk_p:.3f}"
-    ax.text(0.02, 0.95, ann_text, transform=ax.transAxes, va="top", fontsize=9,
-            bbox=dict(facecolor="white", alpha=0.7, edgecolor="none"))
+    ax.relim()
+    ax.autoscale_view()
 
-    ax.grid(alpha=0.3)
-    ax.legend(loc="lower left", fontsize=9)
+def draw_monthly(ax2, art2, st, mon_slice, n_out):
+    if mon_slice is None:  # only reached for the combined figure: leave the panel empty
+        art2["monthly"].set_data([], [])
+        art2["roll12"].set_data([], [])
+        ax2.set_title(f"{st} — no monthly data")
+        # hide ticks, grid and legend so the previous station's limits don't show
+        ax2.set_axis_off()
+        art2["legend"].set_visible(False)
+        return
+    ax2.set_axis_on()
+    art2["legend"].set_visible(True)
+    dates, values = mon_slice
+    rain_mon = pd.Series(values, index=dates)
+    if bn is not None:
+        roll12 = bn.move_mean(rain_mon.to_numpy(dtype=np.float64), window=12, min_count=6)
+    else:
+        roll12 = rain_mon.rolling(window=12, min_periods=6).mean().to_numpy()
+
+    # more vertices than ~2 per pixel column only cost draw time: thin long series
+    keep = lttb_indices(rain_mon.index.asi8.astype(np.float64), rain_mon.to_numpy(dtype=np.float64), n_out)
+    x_mon = mdates.date2num(rain_mon.index)
+    art2["monthly"].set_data(x_mon[keep], rain_mon.values[keep])
+    art2["roll12"].set_data(x_mon, roll12)
+    ax2.set_title(f"{st} — Monthly rainfall & 12-mo mean")
+    ax2.relim()
+    ax2.autoscale_view()
+
+def plot_station(st, ann_slice, mon_slice, output_dir, dpi, plot_monthly):
+    """
+    Draw (and save) the annual and optional monthly plot of one station.
 
+    ann_slice: (years, rain, (lin_slope, lin_intercept), (mk_trend, mk_p, mk_tau))
+    mon_slice: (dates, rain) on a month-start index (NaN = missing month), or None
+    returns the log lines for this station
+    """
+    log = []
+    output_dir = Path(output_dir)  # also accepts a plain string setting
+    years, rain, (slope, intercept), mk_stats = ann_slice
+
+    # --- Both panels in one figure ---
+    if combined_figure and plot_monthly:
+        fig, [(ax, art), (ax2, art2)] = get_figure("combined")
+        draw_annual(ax, art, st, years, rain, slope, intercept, mk_stats)
+        draw_monthly(ax2, art2, st, mon_slice, 2 * int(fig.get_size_inches()[0] * dpi))
+        if mon_slice is None:
+            log.append(f"  -> No monthly data for {st}, monthly panel left empty.")
+        if save_png:
+            out = output_dir / f"{st}_timeseries.png"
+            fig.savefig(out, dpi=dpi)
+            log.append(f"  -> Saved {out}")
+        return log
+
+    # --- Plot annual series ---
+    fig, [(ax, art)] = get_figure("annual")
+    draw_annual(ax, art, st, years, rain, slope, intercept, mk_stats)
     if save_png:
-        out = os.path.join(output_dir, f"{st}_annual_timeseries.png")
-        plt.savefig(out, dpi=dpi, bbox_inches="tight")
-        print(f"  -> Saved {out}")
-    plt.close(fig)
+        out = output_dir / f"{st}_annual_timeseries.png"
+        fig.savefig(out, dpi=dpi)
+        log.append(f"  -> Saved {out}")
 
     # --- Optional: monthly plot with 12-month rolling mean ---
     if plot_monthly:
-        s_mon = df_mon[df_mon["Station"] == st].sort_values("Date")
-        if not s_mon.empty:
-            # ensure Date is datetime
-            s_mon["Date"] = pd.to_datetime(s_mon["Date"])
-            s_mon = s_mon.set_index("Date").asfreq("MS")  # ensure monthly index
-            # fill missing months with NaN (do not fill values)
-            rain_mon = s_mon["Rainfall"].astype(float)
-            roll12 = rain_mon.rolling(window=12, min_periods=6).mean()
-
-            fig2, ax2 = plt.subplots(figsize=(10, 3.2))
-            ax2.plot(rain_mon.index, rain_mon.values, color="lightgray", lw=0.6, label="Monthly rainfall")
-            ax2.plot(roll12.index, roll12.values, color="tab:blue", lw=1.6, label="12-mo rolling mean")
-            ax2.set_ylabel("Rainfall (mm)")
-            ax2.set_xlabel("Date")
-            ax2.set_title(f"{st} — Monthly rainfall & 12-mo mean")
-            ax2.grid(alpha=0.25)
-            ax2.legend(fontsize=9)
+        if mon_slice is not None:
+            fig2, [(ax2, art2)] = get_figure("monthly")
+            mon_dpi = dpi if monthly_format == "pdf" else raster_dpi
+            draw_monthly(ax2, art2, st, mon_slice, 2 * int(fig2.get_size_inches()[0] * mon_dpi))
             if save_png:
-                out2 = os.path.join(output_dir, f"{st}_monthly_timeseries.png")
-                plt.savefig(out2, dpi=dpi, bbox_inches="tight")
-                print(f"  -> Saved {out2}")
-            plt.close(fig2)
+                out2 = output_dir / f"{st}_monthly_timeseries.{monthly_format}"
+                fig2.savefig(out2, dpi=mon_dpi)
+                log.append(f"  -> Saved {out2}")
         else:
-            print(f"  -> No monthly data for {st}, skipping monthly plot.")
+            log.append(f"  -> No monthly data for {st}, skipping monthly plot.")
+    return log
+
+def warm_up(plot_monthly):
+    """
+    Per-worker start-up run ahead of the station tasks: builds the reused figures
+    and compiles (or loads from the numba cache) the kernels with the argument
+    types plot_station passes, so the first station does not pay for it.
+    """
+    get_figure("combined" if combined_figure and plot_monthly else "annual")
+    if plot_monthly and not combined_figure:
+        get_figure("monthly")
+    sens_slope(np.arange(3, dtype=np.int32), np.zeros(3, dtype=np.float32))
+    lttb_indices(np.arange(3, dtype=np.float64), np.zeros(3), 3)
+
+# (guarded so worker processes can import this file without re-running the script)
+if __name__ == "__main__":
+    # Start the plotting workers first: their start-up (figures, numba kernels) then
+    # runs while this process loads the data and computes the trend statistics below
+    workers = n_workers or min(os.cpu_count() or 1, 61)  # ProcessPoolExecutor's own default
+    ex = ProcessPoolExecutor(max_workers=workers)
+    for _ in range(workers):
+        ex.submit(warm_up, plot_monthly)
+
+    # Load data
+    print("Loading aggregated data...")
+    df_ann = pd.read_parquet(annual_path)        # expects columns: Station, Year, Rainfall
+    normalize_columns(df_ann)
+    df_ann["Station"] = df_ann["Station"].astype("category")  # no-op for the parquet aggregates
+    if not df_ann["Station"].cat.categories.is_monotonic_increasing:  # e.g. categories in file order
+        df_ann["Station"] = df_ann["Station"].cat.reorder_categories(sorted(df_ann["Station"].cat.categories))
+
+    # Check monthly file only if plotting monthly
+    if plot_monthly:
+        try:
+            df_mon = pd.read_parquet(monthly_path)  # expects Station, Year, Month, Rainfall
+            normalize_columns(df_mon)
+            # create a Date column for monthly series
+            if "Year" in df_mon.columns and "Month" in df_mon.columns:
+                df_mon["Date"] = pd.to_datetime(dict(year=df_mon["Year"], month=df_mon["Month"], day=1))
+        except Exception as e:
+            print("Warning: monthly file could not be loaded or parsed. Skipping monthly plots.")
+            print(e)
+            plot_monthly = False
+
+    # Split each table by station once (pre-sorted, so every group is already in time order)
+    df_ann = df_ann.sort_values(["Station", "Year"])
+    ann_groups = dict(iter(df_ann.groupby("Station", sort=False, observed=True)))
+    if plot_monthly:
+        df_mon = df_mon.sort_values(["Station", "Date"])
+        mon_groups = dict(iter(df_mon.groupby("Station", sort=False, observed=True)))
+        if pad_to_full_period:
+            # one month-start index for every station; missing months become NaN (values are not filled)
+            full_idx = pd.date_range(df_mon["Date"].min(), df_mon["Date"].max(), freq="MS")
+
+    # Linear fits for all stations at once: (Year x Station) matrix, NaN where a year is missing
+    R = df_ann.pivot(index="Year", columns="Station", values="Rainfall").sort_index()
+    m = R.notna().to_numpy()
+    Rv = np.where(m, R.to_numpy(dtype=float), 0.0)
+    yv = np.where(m, R.index.to_numpy(dtype=float)[:, None], 0.0)
+    cnt = m.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ybar = yv.sum(axis=0) / cnt
+        Rbar = Rv.sum(axis=0) / cnt
+        dy = np.where(m, yv - ybar, 0.0)
+        lin_slope = (dy * (Rv - Rbar)).sum(axis=0) / (dy ** 2).sum(axis=0)
+    lin_intercept = Rbar - lin_slope * ybar
+    lin_fit = dict(zip(R.columns, zip(lin_slope, lin_intercept)))
+
+    # Mann-Kendall for all stations at once on the same matrix (one row per station)
+    mk_tau_all, mk_p_all, mk_trend_all, _ = mann_kendall_batch(R.to_numpy(dtype=float).T)
+    mk_stats = dict(zip(R.columns, zip(mk_trend_all, mk_p_all, mk_tau_all)))
+
+    # Station list
+    # categories are the sorted station names (reordered after loading if needed)
+    stations = df_ann["Station"].cat.categories.tolist()
+    print(f"Found {len(stations)} stations.")
+
+    # If user set stations_to_plot == "all", use all; else verify provided names
+    if isinstance(stations_to_plot, str) and stations_to_plot.lower() == "all":
+        selected = stations
+    else:
+        # assume list
+        selected = [s for s in stations_to_plot if s in stations]
+        if not selected:
+            print("No valid stations specified in stations_to_plot. Falling back to all stations.")
+            selected = stations
+
+    # Per-station inputs as plain arrays (cheap to send to the worker processes)
+    tasks = []
+    for st in selected:
+        s_ann = ann_groups.get(st)
+        if s_ann is None or s_ann.empty:
+            print(f"  -> No annual data for {st}, skipping.")
+            continue
+        # float32 is plenty for drawing and halves what is pickled to the workers; the MK
+        # statistics above stay float64 (rounding could turn distinct totals into ties)
+        ann_slice = (s_ann["Year"].to_numpy(dtype=np.int32), s_ann["Rainfall"].to_numpy(dtype=np.float32),
+                     lin_fit[st], mk_stats[st])
+        s_mon = mon_groups.get(st) if plot_monthly else None
+        mon_slice = None
+        if s_mon is not None and not s_mon.empty:
+            if s_mon["Date"].duplicated().any():  # reindex needs one row per month
+                raise ValueError(f"Duplicate months for station {st} in {monthly_path}")
+            # station's own first..last month (group is sorted by date) unless padding to the full record
+            idx = full_idx if pad_to_full_period else pd.date_range(s_mon["Date"].iloc[0], s_mon["Date"].iloc[-1], freq="MS")
+            rain_mon = s_mon.set_index("Date")["Rainfall"].reindex(idx)
+            mon_slice = (idx, rain_mon.to_numpy(dtype=np.float32))
+        tasks.append((st, ann_slice, mon_slice))
+
+    # Create plots: stations are independent, so draw them in parallel processes
+    with ex:
+        futures = [ex.submit(plot_station, st, ann_slice, mon_slice, output_dir, dpi, plot_monthly)
+                   for st, ann_slice, mon_slice in tasks]
+        for (st, _, _), fut in zip(tasks, futures):
+            print(f"Plotting station: {st}")
+            for line in fut.result():
+                print(line)
 
-print("All done.")
+    print("All done.")